@@ -196,3 +196,15 @@ intersphinx_mapping = {
     'pydm-api': ('https://slaclab.github.io/pydm/', None),
     'python': ('https://docs.python.org/', None),
     }
+
+
+def add_cli_help(app, what, name, obj, options, lines):
+    """Append the command line help to the typhos.cli module docs."""
+    if what == 'module' and name == 'typhos.cli':
+        lines.extend(['', '::', ''])
+        lines.extend('    ' + line
+                     for line in obj.parser.format_help().splitlines())
+
+
+def setup(app):
+    app.connect('autodoc-process-docstring', add_cli_help)
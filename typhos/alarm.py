@@ -4,9 +4,11 @@ Module to define alarm summary frameworks and widgets.
 import enum
 import logging
 import os
-from collections import defaultdict
+import weakref
+from collections import Counter, defaultdict
 from dataclasses import dataclass
-from functools import partial
+from functools import lru_cache
+from typing import Optional
 
 from ophyd.device import Kind
 from ophyd.signal import EpicsSignalBase
@@ -52,18 +54,85 @@ _AlarmLevel = pyqt_class_from_enum(AlarmLevel)
 
 
 # Define behavior for the user's Kind selection.
+# Each KindLevel accepts a set of Kind values, stored as a bit mask with
+# bit n set if a signal with kind n should be included.
+_KIND_MASKS = {
+    KindLevel.HINTED: 1 << Kind.hinted,
+    KindLevel.NORMAL: (1 << Kind.hinted) | (1 << Kind.normal),
+    KindLevel.CONFIG: ~(1 << Kind.omitted),
+    KindLevel.OMITTED: ~0,
+    }
+
+
+def _kind_filter(mask):
+    """Create a signal walk filter that accepts the kinds in ``mask``."""
+    def filter_by(walk):
+        return (mask >> walk.item.kind) & 1
+    return filter_by
+
+
 KIND_FILTERS = {
-    KindLevel.HINTED:
-        (lambda walk: walk.item.kind == Kind.hinted),
-    KindLevel.NORMAL:
-        (lambda walk: walk.item.kind in (Kind.hinted, Kind.normal)),
-    KindLevel.CONFIG:
-        (lambda walk: walk.item.kind != Kind.omitted),
-    KindLevel.OMITTED:
-        (lambda walk: True),
+    level: _kind_filter(mask) for level, mask in _KIND_MASKS.items()
     }
 
 
+# Per-device cache of (address, dotted_name, signal ref) keyed by KindLevel.
+# Only weak references to signals are kept so the cache never keeps a device
+# alive. Refs are only stored for signals that need register_signal.
+_SIGNAL_CACHE = weakref.WeakKeyDictionary()
+
+
+def _signals_for_device(device, kind_level):
+    """
+    Get the alarm channel entries of a device for a given kind level.
+
+    Walking all of a device's signals is expensive for large devices, so the
+    result is cached per device and kind level and reused when the device is
+    added again or the kind level is toggled back.
+
+    Parameters
+    ----------
+    device : ophyd.Device
+        The device to inspect.
+
+    kind_level : KindLevel
+        The kind level used to filter the signals.
+
+    Returns
+    -------
+    entries : tuple of (str, str, weakref.ref or None)
+        The channel address, dotted name and, for non-EPICS signals, a weak
+        reference to the signal so it can be registered with the plugin.
+    """
+    try:
+        by_level = _SIGNAL_CACHE[device]
+    except KeyError:
+        by_level = _SIGNAL_CACHE[device] = {}
+    except TypeError:
+        # Not weak-referenceable; skip caching
+        by_level = {}
+
+    try:
+        return by_level[kind_level]
+    except KeyError:
+        pass
+
+    sigs = get_all_signals_from_device(
+        device,
+        filter_by=KIND_FILTERS[kind_level]
+        )
+    entries = tuple(
+        (
+            channel_from_signal(sig),
+            sig.dotted_name,
+            None if isinstance(sig, EpicsSignalBase) else weakref.ref(sig),
+            )
+        for sig in sigs
+        )
+    by_level[kind_level] = entries
+    return entries
+
+
 @dataclass
 class SignalInfo:
     address: str
@@ -71,6 +140,8 @@ class SignalInfo:
     signal_name: str
     connected: bool
     severity: int
+    # The alarm widget to notify when the channel reports an update
+    alarm_widget: Optional['TyphosAlarm'] = None
 
     @property
     def alarm(self) -> AlarmLevel:
@@ -92,6 +163,20 @@ class SignalInfo:
         else:
             return desc
 
+    def update_connection(self, connected: bool):
+        """Slot that will be called when the PV connects or disconnects."""
+        if self.alarm_widget is None:
+            self.connected = connected
+        else:
+            self.alarm_widget.update_signal_connection(self, connected)
+
+    def update_severity(self, severity: int):
+        """Slot that will be called when the PV's alarm severity changes."""
+        if self.alarm_widget is None:
+            self.severity = severity
+        else:
+            self.alarm_widget.update_signal_severity(self, severity)
+
 
 class TyphosAlarm(TyphosObject, PyDMDrawing, _KindLevel, _AlarmLevel):
     """
@@ -123,9 +208,41 @@ class TyphosAlarm(TyphosObject, PyDMDrawing, _KindLevel, _AlarmLevel):
         self.penWidth = 2
         self.penColor = QtGui.QColor('black')
         self.penStyle = Qt.SolidLine
+        # Channels waiting to be connected once we return to the event loop
+        self._pending_connections = {}
+        self._connection_timer = QtCore.QTimer(self)
+        self._connection_timer.setSingleShot(True)
+        self._connection_timer.setInterval(0)
+        self._connection_timer.timeout.connect(
+            self._establish_pending_connections
+            )
+        # The colors for every alarm level are set up front, and are picked
+        # between using the alarmLevel property in set_alarm_color
+        self.setStyleSheet(alarm_stylesheet(self.__class__))
+        self.signal_info = {}
+        self.device_info = defaultdict(list)
+        # Number of users (devices or the channel property) of each address
+        self._signal_refs = Counter()
         self.reset_alarm_state()
+        # A queued connection is not an option here, as Qt cannot queue the
+        # unregistered AlarmLevel argument type.
         self.alarm_changed.connect(self.set_alarm_color)
 
+    def setStyleSheet(self, style_sheet):
+        """
+        Set the stylesheet, keeping the alarm colors in front of it.
+
+        The colors for every alarm level live in this widget's stylesheet,
+        so they are put back ahead of any stylesheet set later on, for
+        example from a .ui file or by the user.
+        """
+        alarm_sheet = alarm_stylesheet(self.__class__)
+        if not style_sheet:
+            style_sheet = alarm_sheet
+        elif not style_sheet.startswith(alarm_sheet):
+            style_sheet = f'{alarm_sheet}\n{style_sheet}'
+        super().setStyleSheet(style_sheet)
+
     @QtCore.Property(_KindLevel)
     def kindLevel(self):
         """
@@ -170,10 +287,13 @@ class TyphosAlarm(TyphosObject, PyDMDrawing, _KindLevel, _AlarmLevel):
             # Remove old connection
             if self._channels:
                 for channel in self._channels:
-                    if hasattr(channel, 'disconnect'):
+                    # Only release the reference this property still holds,
+                    # the address may be owned by a device since a clear
+                    info = self.signal_info.get(channel.address)
+                    if info is not None and info.channel is channel:
+                        self._release_signal_info(channel.address)
+                    elif hasattr(channel, 'disconnect'):
                         channel.disconnect()
-                    if channel in self.signal_info:
-                        del self.signal_info[channel]
                 self._channels.clear()
             # Load new channel
             self._channel = str(value)
@@ -182,44 +302,144 @@ class TyphosAlarm(TyphosObject, PyDMDrawing, _KindLevel, _AlarmLevel):
                     address=self._channel,
                     tx_slot=self._tx,
                     )
-            else:
-                channel = PyDMChannel(
-                    address=self._channel,
-                    connection_slot=partial(self.update_connection,
-                                            addr=self._channel),
-                    severity_slot=partial(self.update_severity,
-                                          addr=self._channel),
-                    )
-                self.signal_info[self._channel] = SignalInfo(
-                    address=self._channel,
-                    channel=channel,
-                    signal_name='',
-                    connected=False,
-                    severity=AlarmLevel.INVALID,
-                    )
-            self._channels = [channel]
-            # Connect the channel to the HappiPlugin
-            if hasattr(channel, 'connect'):
+                self._channels = [channel]
+                self._channel_cache = None
+                # Connect the channel to the HappiPlugin
                 channel.connect()
+            else:
+                channel = self._acquire_signal_info(self._channel).channel
+                self._channels = [channel]
+                self._channel_cache = None
 
     def _tx(self, value):
         """Receive information from happi channel"""
         self.add_device(value['obj'])
 
     def reset_alarm_state(self):
-        self.signal_info = {}
-        self.device_info = defaultdict(list)
+        self.signal_info.clear()
+        self.device_info.clear()
+        self._signal_refs.clear()
+        self._pending_connections.clear()
+        self._alarm_update_pending = False
+        self._channel_cache = None
+        # Running totals over signal_info, see update_current_alarm
+        self._disconnected_count = 0
+        self._severity_counts = [0] * len(AlarmLevel)
         self.alarm_summary = AlarmLevel.DISCONNECTED
         self.set_alarm_color(AlarmLevel.DISCONNECTED)
 
+    def _create_signal_info(self, addr, signal_name=''):
+        """
+        Create a SignalInfo along with a PyDMChannel that reports to it.
+
+        The channel's slots are the SignalInfo's own methods, so there is no
+        need to look up the address on every update.
+        """
+        info = SignalInfo(
+            address=addr,
+            channel=None,
+            signal_name=signal_name,
+            connected=False,
+            severity=AlarmLevel.INVALID,
+            alarm_widget=self,
+            )
+        info.channel = PyDMChannel(
+            address=addr,
+            connection_slot=info.update_connection,
+            severity_slot=info.update_severity,
+            )
+        return info
+
+    def _acquire_signal_info(self, addr, signal_name='', defer=False):
+        """
+        Get the SignalInfo for ``addr``, creating and connecting it if needed.
+
+        Channels are shared between everything that uses the same address,
+        so that we only subscribe to each PV once. Each call should be
+        balanced by a call to ``_release_signal_info``.
+
+        If ``defer`` is True, a newly created channel is connected from the
+        event loop by ``_establish_pending_connections`` instead.
+        """
+        info = self.signal_info.get(addr)
+        if info is not None and not info.signal_name:
+            # Acquired by the channel property first, which has no name
+            info.signal_name = signal_name
+        elif info is None:
+            info = self._create_signal_info(addr, signal_name=signal_name)
+            self._add_signal_info(info)
+            if defer:
+                self._pending_connections[addr] = info
+                if not self._connection_timer.isActive():
+                    self._connection_timer.start()
+            else:
+                info.channel.connect()
+        self._signal_refs[addr] += 1
+        return info
+
+    def _release_signal_info(self, addr):
+        """
+        Release a SignalInfo acquired by ``_acquire_signal_info``.
+
+        Once nothing is using the address, its channel is disconnected and it
+        is no longer included in the alarm summary.
+        """
+        self._signal_refs[addr] -= 1
+        if self._signal_refs[addr] <= 0:
+            del self._signal_refs[addr]
+            # A channel that is still pending was never connected
+            if self._pending_connections.pop(addr, None) is None:
+                self.signal_info[addr].channel.disconnect()
+            self._remove_signal_info(addr)
+            self.update_current_alarm()
+
+    @QtCore.Slot()
+    def _establish_pending_connections(self):
+        """
+        Connect the channels queued up by ``_acquire_signal_info``.
+
+        Only channels that are still part of the alarm summary are connected,
+        so anything released or cleared in the meantime is skipped.
+        """
+        pending = list(self._pending_connections.values())
+        self._pending_connections.clear()
+        connected = False
+        for info in pending:
+            if self.signal_info.get(info.address) is info:
+                info.channel.connect()
+                connected = True
+        # Connected channels check the alarm as they report in
+        if not connected and self._alarm_update_pending:
+            self.update_current_alarm()
+
+    def _add_signal_info(self, info):
+        """Track a new SignalInfo, keeping the alarm totals up to date."""
+        self.signal_info[info.address] = info
+        self._channel_cache = None
+        if not info.connected:
+            self._disconnected_count += 1
+        self._severity_counts[info.severity] += 1
+
+    def _remove_signal_info(self, addr):
+        """Stop tracking a SignalInfo, keeping the alarm totals up to date."""
+        info = self.signal_info.pop(addr)
+        self._channel_cache = None
+        if not info.connected:
+            self._disconnected_count -= 1
+        self._severity_counts[info.severity] -= 1
+
     def channels(self):
         """
         Let pydm know about our pydm channels.
+
+        The list is built on first use and cached until our channels change.
         """
-        ch = list(self._channels)
-        for info in self.signal_info.values():
-            ch.append(info.channel)
-        return ch
+        if self._channel_cache is None:
+            ch = list(self._channels)
+            for info in self.signal_info.values():
+                ch.append(info.channel)
+            self._channel_cache = ch
+        return self._channel_cache
 
     def add_device(self, device):
         """
@@ -232,45 +452,52 @@ class TyphosAlarm(TyphosObject, PyDMDrawing, _KindLevel, _AlarmLevel):
         """
         Reset this widget down to the "no alarm handling" state.
         """
-        for ch in (info.channel for info in self.signal_info.values()):
-            ch.disconnect()
+        # Reset first, so that anything handled while we process events below
+        # starts from a clean state and is not dropped without a disconnect
+        connected = [
+            info for addr, info in self.signal_info.items()
+            if addr not in self._pending_connections
+            ]
         self.reset_alarm_state()
+        for num, info in enumerate(connected, start=1):
+            info.channel.disconnect()
+            # Keep the UI responsive while disconnecting many channels
+            if num % 256 == 0:
+                QtWidgets.QApplication.processEvents()
 
-    def setup_alarm_config(self, device):
+    def setup_alarm_config(self, device, defer=True):
         """
         Add a device to the alarm summary.
 
         This will pick PVs based on the device kind and the configured kind
         level, configuring the PyDMChannels to update our alarm state and
         color when we get updates from our PVs.
+
+        Parameters
+        ----------
+        device : ophyd.Device
+            The device to include in the alarm summary.
+
+        defer : bool, optional
+            If True (default), queue the channel connections and establish
+            them once we return to the Qt event loop, so that adding a large
+            device does not block the UI. If False, connect each channel
+            immediately.
         """
-        sigs = get_all_signals_from_device(
-            device,
-            filter_by=KIND_FILTERS[self._kind_level]
-            )
-        channel_addrs = [channel_from_signal(sig) for sig in sigs]
-        for sig in sigs:
-            if not isinstance(sig, EpicsSignalBase):
-                register_signal(sig)
-        channels = [
-            PyDMChannel(
-                address=addr,
-                connection_slot=partial(self.update_connection, addr=addr),
-                severity_slot=partial(self.update_severity, addr=addr),
-                )
-            for addr in channel_addrs]
-
-        for ch, sig in zip(channels, sigs):
-            info = SignalInfo(
-                address=ch.address,
-                channel=ch,
-                signal_name=sig.dotted_name,
-                connected=False,
-                severity=AlarmLevel.INVALID,
+        entries = _signals_for_device(device, self._kind_level)
+        for _, _, sig_ref in entries:
+            if sig_ref is not None:
+                sig = sig_ref()
+                if sig is not None:
+                    register_signal(sig)
+
+        for addr, signal_name, _ in entries:
+            info = self._acquire_signal_info(
+                addr,
+                signal_name=signal_name,
+                defer=defer,
                 )
-            self.signal_info[ch.address] = info
             self.device_info[device.name].append(info)
-            ch.connect()
 
         all_channels = self.channels()
         if all_channels:
@@ -286,23 +513,58 @@ class TyphosAlarm(TyphosObject, PyDMDrawing, _KindLevel, _AlarmLevel):
 
     def update_alarm_config(self):
         """
-        Clean up the existing alarm config and create a new one.
+        Bring the existing alarm config in line with our settings.
 
         This must be called when settings like KindLevel are changed so we can
-        re-evaluate them.
+        re-evaluate them. Channels that are still included are kept as they
+        are, so only the signals that were added or dropped are connected or
+        disconnected.
         """
-        self.clear_all_alarm_configs()
         for dev in self.devices:
+            old_info = self.device_info.pop(dev.name, [])
+            # Set up the new config first, so shared channels are reused
             self.setup_alarm_config(dev)
+            for info in old_info:
+                self._release_signal_info(info.address)
 
     def update_connection(self, connected, addr):
-        """Slot that will be called when a PV connects or disconnects."""
-        self.signal_info[addr].connected = connected
-        self.update_current_alarm()
+        """
+        Record a connection change for the PV at ``addr``.
+
+        Kept for backwards compatibility: channels now report to their
+        SignalInfo, which calls ``update_signal_connection`` directly.
+        """
+        self.update_signal_connection(self.signal_info[addr], connected)
 
     def update_severity(self, severity, addr):
-        """Slot that will be called when a PV's alarm severity changes."""
-        self.signal_info[addr].severity = severity
+        """
+        Record an alarm severity change for the PV at ``addr``.
+
+        Kept for backwards compatibility: channels now report to their
+        SignalInfo, which calls ``update_signal_severity`` directly.
+        """
+        self.update_signal_severity(self.signal_info[addr], severity)
+
+    def update_signal_connection(self, info, connected):
+        """Record a connection change reported by a SignalInfo's channel."""
+        if self.signal_info.get(info.address) is not info:
+            # No longer part of the alarm summary
+            info.connected = connected
+            return
+        if info.connected != connected:
+            self._disconnected_count += -1 if connected else 1
+        info.connected = connected
+        self.update_current_alarm()
+
+    def update_signal_severity(self, info, severity):
+        """Record a severity change reported by a SignalInfo's channel."""
+        if self.signal_info.get(info.address) is not info:
+            # No longer part of the alarm summary
+            info.severity = severity
+            return
+        self._severity_counts[info.severity] -= 1
+        self._severity_counts[severity] += 1
+        info.severity = severity
         self.update_current_alarm()
 
     def update_current_alarm(self):
@@ -312,11 +574,23 @@ class TyphosAlarm(TyphosObject, PyDMDrawing, _KindLevel, _AlarmLevel):
         If the alarm state is different than the last time we checked,
         emit the "alarm_changed" signal. This signal is configured at
         init to change the color of this widget.
+
+        Rather than scanning every signal, this uses the running totals
+        maintained by the connection and severity slots. While channels are
+        still waiting to be connected the check is put off until they do.
         """
+        if self._pending_connections:
+            self._alarm_update_pending = True
+            return
+        self._alarm_update_pending = False
         if not self.signal_info:
             new_alarm = AlarmLevel.INVALID
+        elif self._disconnected_count:
+            new_alarm = AlarmLevel.DISCONNECTED
         else:
-            new_alarm = max(info.alarm for info in self.signal_info.values())
+            new_alarm = max(
+                level for level in AlarmLevel if self._severity_counts[level]
+                )
         if new_alarm != self.alarm_summary:
             try:
                 self.alarm_changed.emit(new_alarm)
@@ -332,11 +606,24 @@ class TyphosAlarm(TyphosObject, PyDMDrawing, _KindLevel, _AlarmLevel):
 
         self.alarm_summary = new_alarm
 
+    @QtCore.Slot(_AlarmLevel)
     def set_alarm_color(self, alarm_level):
         """
         Change the alarm color to the shade defined by the current alarm level.
+
+        Rather than replacing the stylesheet, which makes Qt parse it again,
+        this updates the alarmLevel property that the stylesheet from
+        alarm_stylesheet uses to select the color, and re-polishes the widget.
         """
-        self.setStyleSheet(indicator_stylesheet(self.__class__, alarm_level))
+        alarm_level = int(AlarmLevel(alarm_level))
+        if self.property('alarmLevel') == alarm_level:
+            # Already showing this color, skip the restyle
+            return
+        self.setProperty('alarmLevel', alarm_level)
+        style = self.style()
+        style.unpolish(self)
+        style.polish(self)
+        self.update()
 
     def eventFilter(self, obj, event):
         """
@@ -421,10 +708,35 @@ class TyphosAlarmPolygon(TyphosAlarm, PyDMDrawingPolygon):
     numberOfPoints = PyDMDrawingPolygon.numberOfPoints
 
 
+# The end of the indicator stylesheet, setting the color for each alarm level
+_ALARM_SUFFIX = {
+    AlarmLevel.DISCONNECTED: '(255,255,255,255);}',
+    AlarmLevel.NO_ALARM: '(0,255,0,255);}',
+    AlarmLevel.MINOR: '(255,255,0,255);}',
+    AlarmLevel.MAJOR: '(255,0,0,255);}',
+    AlarmLevel.INVALID: '(255,0,255,255);}',
+    }
+
+
+@lru_cache(maxsize=None)
+def _indicator_prefix(selector):
+    """The start of the indicator stylesheet, shared by all alarm levels."""
+    return (
+        f'{selector} '
+        '{border: none; '
+        ' background: transparent;'
+        ' qproperty-brush: rgba'
+        )
+
+
+@lru_cache(maxsize=None)
 def indicator_stylesheet(shape_cls, alarm):
     """
     Create the indicator stylesheet that will modify a PyDMDrawing's color.
 
+    The result is cached, as there are only a handful of shape and alarm
+    level combinations and this is called on every alarm change.
+
     Parameters
     ----------
     shape_cls : type
@@ -438,22 +750,34 @@ def indicator_stylesheet(shape_cls, alarm):
     indicator_stylesheet : str
         The correctly colored stylesheet to apply to the widget.
     """
-    base = (
-        f'{shape_cls.__name__} '
-        '{border: none; '
-        ' background: transparent;'
-        ' qproperty-brush: rgba'
-        )
+    try:
+        suffix = _ALARM_SUFFIX[alarm]
+    except KeyError:
+        raise ValueError(f'Recieved invalid alarm level {alarm}') from None
+    return _indicator_prefix(shape_cls.__name__) + suffix
 
-    if alarm == AlarmLevel.DISCONNECTED:
-        return base + '(255,255,255,255);}'
-    elif alarm == AlarmLevel.NO_ALARM:
-        return base + '(0,255,0,255);}'
-    elif alarm == AlarmLevel.MINOR:
-        return base + '(255,255,0,255);}'
-    elif alarm == AlarmLevel.MAJOR:
-        return base + '(255,0,0,255);}'
-    elif alarm == AlarmLevel.INVALID:
-        return base + '(255,0,255,255);}'
-    else:
-        raise ValueError(f'Recieved invalid alarm level {alarm}')
+
+@lru_cache(maxsize=None)
+def alarm_stylesheet(shape_cls):
+    """
+    Create a stylesheet with the indicator colors for every alarm level.
+
+    This is applied once to each alarm widget. The color in use is then
+    selected by the widget's ``alarmLevel`` dynamic property.
+
+    Parameters
+    ----------
+    shape_cls : type
+        The PyDMDrawing widget subclass.
+
+    Returns
+    -------
+    alarm_stylesheet : str
+        The stylesheet to apply to the widget.
+    """
+    return '\n'.join(
+        _indicator_prefix(
+            f'{shape_cls.__name__}[alarmLevel="{int(level)}"]'
+            ) + suffix
+        for level, suffix in _ALARM_SUFFIX.items()
+        )
@@ -1,6 +1,8 @@
 """This module defines the ``typhos`` command line utility"""
 import argparse
 import ast
+import concurrent.futures
+import functools
 import inspect
 import logging
 import re
@@ -8,22 +10,22 @@ import signal
 import sys
 from typing import List, Optional
 
-import coloredlogs
-import pcdsutils
-from ophyd.sim import clear_fake_device, make_fake_device
 from pydm.widgets.template_repeater import FlowLayout
 from qtpy import QtCore, QtWidgets
 
 import typhos
 from typhos.app import get_qapp, launch_suite
-from typhos.benchmark.cases import run_benchmarks
-from typhos.benchmark.profile import profiler_context
 from typhos.display import DisplayTypes, ScrollOptions
 from typhos.suite import TyphosSuite
 from typhos.utils import nullcontext
 
 logger = logging.getLogger(__name__)
 
+# Matches class specifications such as package.ClassName[{"param1":"val1"}]
+_KLASS_REGEX = re.compile(
+    r'([a-zA-Z][a-zA-Z0-9\.\_]*)\[(\{.+})*[\,]*\]'  # noqa
+)
+
 # Argument Parser Setup
 parser = argparse.ArgumentParser(
     description=(
@@ -169,12 +171,10 @@ parser.add_argument(
 )
 
 
-# Append to module docs
-__doc__ += '\n::\n\n    ' + parser.format_help().replace('\n', '\n    ')
-
-
 def typhos_cli_setup(args):
     """Setup logging and style."""
+    import coloredlogs
+
     # Logging Level handling
     logging.getLogger().addHandler(logging.NullHandler())
     shown_logger = logging.getLogger('typhos')
@@ -379,29 +379,59 @@ def get_scrollable_from_cli(scrollable: str) -> ScrollOptions:
     )
 
 
-def create_devices(device_names, cfg=None, fake_devices=False):
-    """Returns a list of devices to be included in the typhos suite."""
-    logger.debug("Accessing Happi Client ...")
+@functools.lru_cache(maxsize=None)
+def _get_init_args(klass):
+    """Get the argument names for instantiating ``klass``."""
+    return inspect.getfullargspec(klass).args
+
 
+def _load_happi_device(happi_client, device_name):
+    """Load a single happi entry, returning None if it fails to load."""
+    logger.info("Loading %r ...", device_name)
     try:
-        happi_client = _create_happi_client(cfg)
+        return happi_client.load_device(name=device_name)
     except Exception:
-        logger.debug("Unable to create a happi client.", exc_info=True)
-        happi_client = None
+        logger.exception("Unable to load Happi entry: %r", device_name)
+
+
+def create_devices(device_names, cfg=None, fake_devices=False):
+    """Returns a list of devices to be included in the typhos suite."""
+    import pcdsutils
+    from ophyd.sim import clear_fake_device, make_fake_device
+
+    # Sort out class specifications from happi names up front
+    matches = [(name, _KLASS_REGEX.search(name)) for name in device_names]
+
+    # Only bother with happi if we have happi names to load
+    happi_client = None
+    if any(match is None for _, match in matches):
+        logger.debug("Accessing Happi Client ...")
+        try:
+            happi_client = _create_happi_client(cfg)
+        except Exception:
+            logger.debug("Unable to create a happi client.", exc_info=True)
+
+    # Load the happi devices concurrently, as each may block on I/O
+    happi_names = [name for name, match in matches if match is None]
+    happi_loads = []
+    if happi_client and happi_names and not fake_devices:
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(8, len(happi_names))
+        ) as executor:
+            happi_loads = [
+                executor.submit(_load_happi_device, happi_client, name)
+                for name in happi_names
+            ]
+    happi_loads = iter(happi_loads)
 
     # Load and add each device
     devices = list()
 
-    klass_regex = re.compile(
-        r'([a-zA-Z][a-zA-Z0-9\.\_]*)\[(\{.+})*[\,]*\]'  # noqa
-    )
-
-    for device_name in device_names:
-        logger.info("Loading %r ...", device_name)
-        result = klass_regex.findall(device_name)
-        if len(result) > 0:
+    for device_name, match in matches:
+        if match is not None:
+            logger.info("Loading %r ...", device_name)
             try:
-                klass, args = result[0]
+                klass, args = match.groups()
                 klass = pcdsutils.utils.import_helper(klass)
 
                 default_kwargs = {"name": klass.__name__}
@@ -413,7 +443,7 @@ def create_devices(device_names, cfg=None, fake_devices=False):
                     klass = make_fake_device(klass)
                     # Give default value to missing positional args
                     # This might fail, but is best effort
-                    for arg in inspect.getfullargspec(klass).args:
+                    for arg in _get_init_args(klass):
                         if arg not in default_kwargs and arg != 'self':
                             if arg == 'prefix':
                                 default_kwargs[arg] = 'FAKE_PREFIX:'
@@ -439,13 +469,10 @@ def create_devices(device_names, cfg=None, fake_devices=False):
                 raise NotImplementedError(
                     "Fake devices from happi not " "supported yet"
                 )
-            try:
-                device = happi_client.load_device(name=device_name)
+            # Loaded and logged by _load_happi_device
+            device = next(happi_loads).result()
+            if device is not None:
                 devices.append(device)
-            except Exception:
-                logger.exception(
-                    "Unable to load Happi entry: %r", device_name
-                )
         if fake_devices:
             clear_fake_device(device)
     return devices
@@ -537,12 +564,22 @@ def typhos_run(
         return launch_suite(suite, initial_size=initial_size)
 
 
+def _print_version():
+    print(f'Typhos: Version {typhos.__version__} from {typhos.__file__}')
+
+
 def typhos_cli(args):
     """Command Line Application for Typhos."""
+    # Skip argument parsing for the common diagnostic call, leaving any
+    # other combination of arguments to argparse
+    if list(args) in (['--version'], ['-V']):
+        _print_version()
+        return
+
     args = parser.parse_args(args)
 
     if args.version:
-        print(f'Typhos: Version {typhos.__version__} from {typhos.__file__}')
+        _print_version()
         return
 
     if any(
@@ -552,6 +589,8 @@ def typhos_cli(args):
             args.benchmark is not None,
         )
     ):
+        from typhos.benchmark.profile import profiler_context
+
         if args.profile_modules:
             context = profiler_context(
                 module_names=args.profile_modules,
@@ -565,6 +604,8 @@ def typhos_cli(args):
     with context:
         typhos_cli_setup(args)
         if args.benchmark is not None:
+            from typhos.benchmark.cases import run_benchmarks
+
             # Note: actually a list of suites
             suite = run_benchmarks(args.benchmark)
         else:
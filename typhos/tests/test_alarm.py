@@ -6,8 +6,11 @@ from happi.loader import from_container
 from ophyd import Component as Cpt
 from ophyd import Device
 from ophyd.utils.epics_pvs import AlarmSeverity
+from pydm.data_plugins import plugin_for_address
+from qtpy import QtWidgets
 
-from typhos.alarm import (AlarmLevel, TyphosAlarmCircle, TyphosAlarmEllipse,
+from typhos.alarm import (_SIGNAL_CACHE, AlarmLevel, SignalInfo,
+                          TyphosAlarmCircle, TyphosAlarmEllipse,
                           TyphosAlarmPolygon, TyphosAlarmRectangle,
                           TyphosAlarmTriangle)
 from typhos.plugins.core import register_signal
@@ -160,3 +163,154 @@ def test_kinds_many_alarms_add_device(alarm_add_device, device, qtbot):
         device.hint_sig.update_metadata({'connected': False})
 
     assert alarm.alarm_summary == AlarmLevel.DISCONNECTED
+
+
+def test_alarm_recovers_add_device(alarm_add_device, device, qtbot):
+    alarm = alarm_add_device
+
+    with qtbot.wait_signal(alarm.alarm_changed, timeout=1000):
+        device.hint_sig.update_metadata({'severity': AlarmSeverity.MAJOR})
+
+    assert alarm.alarm_summary == AlarmLevel.MAJOR
+
+    with qtbot.wait_signal(alarm.alarm_changed, timeout=1000):
+        device.hint_sig.update_metadata({'connected': False})
+
+    assert alarm.alarm_summary == AlarmLevel.DISCONNECTED
+
+    with qtbot.wait_signal(alarm.alarm_changed, timeout=1000):
+        device.hint_sig.update_metadata(
+            {'connected': True, 'severity': AlarmSeverity.NO_ALARM}
+            )
+
+    assert alarm.alarm_summary == AlarmLevel.NO_ALARM
+
+
+def test_alarm_channels(alarm_add_device):
+    alarm = alarm_add_device
+    assert [ch.address for ch in alarm.channels()] == [
+        'sig://' + alarm.devices[0].hint_sig.name
+        ]
+
+    alarm.kindLevel = alarm.KindLevel.NORMAL
+    assert len(alarm.channels()) == 2
+
+    alarm.clear_all_alarm_configs()
+    assert alarm.channels() == []
+
+
+def test_alarm_clear_before_connect(alarm, device, qtbot):
+    plugin = plugin_for_address('sig://')
+
+    # Clearing before the queued connections are made must not leak them
+    alarm.add_device(device)
+    alarm.clear_all_alarm_configs()
+    QtWidgets.QApplication.processEvents()
+    assert device.hint_sig.name not in plugin.connections
+    assert not device.hint_sig._callbacks['meta']
+
+
+def test_alarm_shared_channels(alarm, device, qtbot):
+    name = 'shared_sig_ch_' + str(uuid4())
+    sig = RichSignal(name=name)
+    register_signal(sig)
+    register_signal(device.hint_sig)
+
+    # The channel and the device share the same hinted signal
+    alarm.channel = 'sig://' + device.hint_sig.name
+    with qtbot.wait_signal(alarm.alarm_changed, timeout=1000):
+        alarm.add_device(device)
+    assert len(alarm.signal_info) == 1
+    # The device fills in the name the channel property could not give
+    assert alarm.device_info[device.name][0].signal_name == 'hint_sig'
+
+    # Changing the channel keeps the device signal around
+    alarm.channel = 'sig://' + name
+    assert len(alarm.signal_info) == 2
+    info = alarm.signal_info['sig://' + name]
+    qtbot.wait_until(
+        lambda: info.connected and info.severity == AlarmLevel.NO_ALARM
+    )
+
+    with qtbot.wait_signal(alarm.alarm_changed, timeout=1000):
+        device.hint_sig.update_metadata({'severity': AlarmSeverity.MAJOR})
+
+    assert alarm.alarm_summary == AlarmLevel.MAJOR
+
+
+def test_alarm_channel_after_clear(alarm, device, qtbot):
+    name = 'after_clear_sig_ch_' + str(uuid4())
+    register_signal(RichSignal(name=name))
+    register_signal(device.hint_sig)
+    hint_address = 'sig://' + device.hint_sig.name
+
+    alarm.channel = hint_address
+    alarm.clear_all_alarm_configs()
+    with qtbot.wait_signal(alarm.alarm_changed, timeout=1000):
+        alarm.add_device(device)
+
+    # The stale channel must not release the device's reference
+    alarm.channel = 'sig://' + name
+    assert alarm.device_info[device.name] == [alarm.signal_info[hint_address]]
+
+
+def test_signal_info_standalone():
+    info = SignalInfo(
+        address='ca://PV',
+        channel=None,
+        signal_name='',
+        connected=False,
+        severity=AlarmLevel.INVALID,
+        )
+    info.update_connection(True)
+    info.update_severity(AlarmLevel.MINOR)
+    assert info.alarm == AlarmLevel.MINOR
+
+
+@pytest.mark.parametrize(
+    "level,rgba", [
+        (AlarmLevel.NO_ALARM, (0, 255, 0, 255)),
+        (AlarmLevel.MAJOR, (255, 0, 0, 255)),
+        (AlarmLevel.DISCONNECTED, (255, 255, 255, 255)),
+        ]
+    )
+def test_alarm_color(alarm, level, rgba):
+    alarm.set_alarm_color(level)
+    assert alarm.brush.color().getRgb() == rgba
+
+
+def test_alarm_color_custom_stylesheet(alarm):
+    alarm.setStyleSheet('* {border: 1px solid black;}')
+    alarm.set_alarm_color(AlarmLevel.MAJOR)
+    assert alarm.brush.color().getRgb() == (255, 0, 0, 255)
+
+
+def test_kinds_narrow_add_device(alarm_add_device, device, qtbot):
+    alarm = alarm_add_device
+    device.norm_sig.update_metadata({'severity': AlarmSeverity.MINOR})
+
+    with qtbot.wait_signal(alarm.alarm_changed, timeout=1000):
+        alarm.kindLevel = alarm.KindLevel.NORMAL
+
+    assert alarm.alarm_summary == AlarmLevel.MINOR
+    hint_info = alarm.signal_info['sig://' + device.hint_sig.name]
+
+    # Dropping back down removes only the normal signal
+    with qtbot.wait_signal(alarm.alarm_changed, timeout=1000):
+        alarm.kindLevel = alarm.KindLevel.HINTED
+
+    assert alarm.alarm_summary == AlarmLevel.NO_ALARM
+    assert len(alarm.signal_info) == 1
+    assert alarm.signal_info['sig://' + device.hint_sig.name] is hint_info
+    assert alarm.device_info[device.name] == [hint_info]
+
+
+def test_signal_cache_reused(alarm_add_device, device):
+    alarm = alarm_add_device
+    entries = _SIGNAL_CACHE[device][alarm.KindLevel.HINTED]
+
+    # Re-adding the device must not walk its signals again
+    alarm.clear_all_alarm_configs()
+    alarm.add_device(device)
+    assert _SIGNAL_CACHE[device][alarm.KindLevel.HINTED] is entries
+    assert list(alarm.signal_info) == [addr for addr, _, _ in entries]
@@ -1,19 +1,30 @@
 import os
+import threading
 
 import pytest
+from ophyd.sim import SynAxis
 
 import typhos
-from typhos.cli import typhos_cli
+import typhos.cli
+from typhos.cli import create_devices, typhos_cli
 
 from . import conftest
 
 
-def test_cli_version(capsys):
-    typhos_cli(['--version'])
+@pytest.mark.parametrize('flag', ['--version', '-V'])
+def test_cli_version(capsys, flag):
+    typhos_cli([flag])
     readout = capsys.readouterr()
     assert typhos.__version__ in readout.out
 
 
+def test_cli_help_with_version(capsys):
+    with pytest.raises(SystemExit):
+        typhos_cli(['--help', '-V'])
+    readout = capsys.readouterr()
+    assert 'usage' in readout.out
+
+
 def test_cli_happi_cfg(qtbot, happi_cfg):
     window = typhos_cli(['test_motor', '--happi-cfg', happi_cfg])
     qtbot.addWidget(window)
@@ -94,3 +105,39 @@ def test_cli_profile_output(capsys, qtbot):
     output = capsys.readouterr()
     assert 'add_device' not in output.out
     assert path_obj.exists()
+
+
+def test_create_devices_without_happi(monkeypatch):
+    def no_happi(cfg):
+        raise AssertionError('happi client should not be needed')
+
+    monkeypatch.setattr(typhos.cli, '_create_happi_client', no_happi)
+    devices = create_devices(["ophyd.sim.SynAxis[{'name':'bar'}]"])
+    assert [dev.name for dev in devices] == ['bar']
+
+
+def test_create_devices_happi(happi_cfg):
+    devices = create_devices(
+        ['test_motor', 'no_motor', "ophyd.sim.SynAxis[{'name':'baz'}]"],
+        cfg=happi_cfg,
+    )
+    assert [dev.name for dev in devices] == ['test_motor', 'baz']
+
+
+def test_create_devices_happi_concurrent(monkeypatch):
+    names = ['motor_a', 'bad_motor', 'motor_b']
+    # Every load waits on the others, so this only passes if they overlap
+    barrier = threading.Barrier(len(names), timeout=5)
+
+    class FakeClient:
+        def load_device(self, name):
+            barrier.wait()
+            if name == 'bad_motor':
+                raise RuntimeError('Failed to load')
+            return SynAxis(name=name)
+
+    monkeypatch.setattr(
+        typhos.cli, '_create_happi_client', lambda cfg: FakeClient()
+    )
+    devices = create_devices(names)
+    assert [dev.name for dev in devices] == ['motor_a', 'motor_b']